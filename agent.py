@@ -1,6 +1,11 @@
 import os
 import json
 import asyncio
+import functools
+import itertools
+import collections
+import jsonutil
+from typing import NamedTuple, Optional
 from google import genai
 from google.genai import types
 from gtts import gTTS
@@ -25,13 +30,91 @@ MODEL_FAMILY_PRIORITY = [
     "gemma"
 ]
 
+# Interactions kept per chat; older entries are evicted automatically
+MAX_HISTORY_PER_CHAT = 1000
+# Past results are cut to this many characters when replayed into prompts
+HISTORY_RESULT_PROMPT_CHARS = 300
+
+def _prompt_describes_actions(prompt: str) -> bool:
+    """A rewritten system prompt must still describe the JSON action format: some "action"
+    after the first "{". Linear in the prompt length (a regex would backtrack at every brace)."""
+    i = prompt.find("{")
+    return i != -1 and "action" in prompt[i:]
+
+# One genai.Client (and so one HTTP connection pool) per API key, shared by all Agents
+_CLIENT_CACHE: dict = {}
+
+def _get_client(api_key: str) -> genai.Client:
+    client = _CLIENT_CACHE.get(api_key)
+    if client is None:
+        client = _CLIENT_CACHE[api_key] = genai.Client(api_key=api_key)
+    return client
+
+@functools.lru_cache(maxsize=16)
+def _read_text(path: str, mtime: float) -> str:
+    """Reads a text file. Cached on (path, mtime) so unchanged files are served from memory."""
+    with open(path, "r") as f:
+        return f.read()
+
+def _read_cached(path: str) -> str:
+    """Returns the contents of path, re-reading it only when its mtime changes.
+    Raises FileNotFoundError if the file does not exist."""
+    return _read_text(path, os.path.getmtime(path))
+
+def _extract_actions(data):
+    """Normalizes a parsed Gemini response into (actions_list, thought).
+    Accepts {"thought": ..., "actions": [...]}, a bare list, or a single action object.
+    Returns (None, "") if data has none of these shapes."""
+    if isinstance(data, dict):
+        if "actions" in data and isinstance(data["actions"], list):
+            return data["actions"], data.get("thought", "")
+        return [data], "" # fallback
+    if isinstance(data, list):
+        return data, ""
+    return None, ""
+
+# Actions whose handler message becomes the turn's result instead of a status line
+_OUTPUT_ACTIONS = frozenset({"inspect_form", "read", "generate_image", "answer", "done"})
+
+# Click reasoning that hints at a page transition (login/submit) and needs a longer wait
+_SUBMIT_KEYWORDS = ["login", "iniciar", "submit", "sign in", "guardar", "save", "register", "registrar"]
+
+class Action(NamedTuple):
+    """One browser action from Gemini's JSON response. Defaults mirror what the
+    model may omit; unknown keys are ignored."""
+    action: Optional[str] = None
+    reasoning: str = ""
+    text: str = ""
+    key: str = ""
+    coordinates: Optional[list] = None
+    direction: str = "down"
+    placeholder: Optional[str] = None
+    label: Optional[str] = None
+    id: object = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Action":
+        return cls._make(data.get(name, default) for name, default in cls._field_defaults.items())
+
+    def has_coordinates(self) -> bool:
+        return bool(self.coordinates) and len(self.coordinates) == 2
+
+def _batch_op(a):
+    """Returns the in-page op for an action that can be fused into BrowserManager.batch_actions,
+    or None if it must run on its own. Only scrolls qualify: every other action needs real
+    pointer/key events, and must behave the same whatever its neighbours are."""
+    if a.action == "scroll":
+        direction = a.direction.lower()
+        if direction in ("down", "up"):
+            return {"op": "scroll", "dy": 500 if direction == "down" else -500}
+    return None
+
 class Agent:
     def __init__(self, browser_manager):
         self.browser = browser_manager
         
         try:
-            with open("geminiapikey.txt", "r") as f:
-                api_key = f.read().strip()
+            api_key = _read_cached("geminiapikey.txt").strip()
         except FileNotFoundError:
             raise ValueError("geminiapikey.txt file not found. Please create it and add your Gemini API key.")
             
@@ -41,7 +124,7 @@ class Agent:
         # Set environment variable as fallback for some SDK calls
         os.environ["GOOGLE_API_KEY"] = api_key
         
-        self.client = genai.Client(api_key=api_key)
+        self.client = _get_client(api_key)
         
         # Rank available models by smartness
         self.ranked_models = self._get_ranked_models()
@@ -54,8 +137,10 @@ class Agent:
 
         self.sessions_file = "sessions.json"
         self.history = self.load_sessions()
+        self._history_context_cache: dict = {} # chat_id -> (history_len, RECENT INTERACTIONS block)
         self.learned_optimizations = self.load_learned_optimizations()
         self.system_instruction = ""
+        self._action_config = None
         self.load_prompt()
         
         # Per-task step journal: reset at the start of each browser task.
@@ -67,6 +152,26 @@ class Agent:
         self._last_action_fingerprint: str = ""
         self._stuck_count: int = 0
 
+        # Action name -> handler; see _execute_action
+        self._actions = {
+            "navigate": self._do_navigate,
+            "click": self._do_click,
+            "type": self._do_type,
+            "fill_by_placeholder": self._do_fill_by_placeholder,
+            "fill_by_label": self._do_fill_by_label,
+            "click_button": self._do_click_button,
+            "click_id": self._do_click_id,
+            "fill_id": self._do_fill_id,
+            "inspect_form": self._do_inspect_form,
+            "key": self._do_key,
+            "read": self._do_read,
+            "scroll": self._do_scroll,
+            "wait": self._do_wait,
+            "generate_image": self._do_generate_image,
+            "answer": self._do_answer,
+            "done": self._do_done,
+        }
+
     def _get_ranked_models(self):
         """Discovers and ranks available Gemini models for the current API key."""
         try:
@@ -150,6 +255,42 @@ class Agent:
         
         raise last_error or Exception("No models available to fulfill the request.")
 
+    async def _stream_gemini(self, contents, config, candidates=None):
+        """Streaming variant of _call_gemini: yields response text chunks as they arrive.
+        Falls back to the next model only if the stream fails before producing any text."""
+        models_to_try = candidates if candidates else self.ranked_models
+        last_error = None
+        
+        for model_name in models_to_try:
+            started = False
+            try:
+                print(f"[FALLBACK] Trying model (stream): {model_name}")
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=model_name,
+                    contents=contents,
+                    config=config
+                )
+                async for chunk in stream:
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+                return
+            except Exception as e:
+                if started:
+                    # Part of the response was already consumed; can't switch models mid-stream
+                    raise e
+                err_str = str(e).lower()
+                if any(x in err_str for x in ["429", "resource_exhausted", "quota", "exhausted", "500", "internal", "503", "unavailable"]):
+                    print(f"[FALLBACK] Model {model_name} failed: {e}. Trying next...")
+                    last_error = e
+                    await asyncio.sleep(1) # Small delay before fallback
+                    continue
+                else:
+                    print(f"[ERROR] Non-retryable error with {model_name}: {e}")
+                    raise e
+        
+        raise last_error or Exception("No models available to fulfill the request.")
+
     async def _call_image_gen(self, prompt):
         """Attempts to generate an image using available image models, falling back on failure."""
         last_error = None
@@ -179,9 +320,10 @@ class Agent:
     def load_sessions(self):
         try:
             with open(self.sessions_file, "r") as f:
-                return json.load(f)
+                sessions = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
+        return {cid: collections.deque(hist, maxlen=MAX_HISTORY_PER_CHAT) for cid, hist in sessions.items()}
 
     def save_sessions(self):
         """Saves history to sessions.json, ensuring the file doesn't exceed 100MB."""
@@ -190,7 +332,7 @@ class Agent:
         # Pruning loop: if the total JSON string size is > 1MB, 
         # remove the oldest entry from the user with the longest history.
         while True:
-            json_data = json.dumps(self.history, indent=4)
+            json_data = json.dumps(self.history, indent=4, default=list)
             if len(json_data) <= max_size:
                 break
                 
@@ -203,26 +345,50 @@ class Agent:
                     best_target = cid
             
             if best_target and max_len > 0:
-                self.history[best_target].pop(0) # Remove oldest
+                self.history[best_target].popleft() # Remove oldest
             else:
                 # If all histories are empty but still > 1MB (unlikely but safe), stop
                 break
 
         with open(self.sessions_file, "w") as f:
-            f.write(json.dumps(self.history, indent=4))
+            f.write(json.dumps(self.history, indent=4, default=list))
 
-    def get_history(self, chat_id: str) -> list:
+    def get_history(self, chat_id: str) -> collections.deque:
         chat_id_str = str(chat_id)
         if chat_id_str not in self.history:
-            self.history[chat_id_str] = []
+            self.history[chat_id_str] = collections.deque(maxlen=MAX_HISTORY_PER_CHAT)
         return self.history[chat_id_str]
 
+    def _recent_history_context(self, chat_id_str: str) -> str:
+        """Builds the RECENT INTERACTIONS prompt block for analyze_and_act.
+        It only changes when the chat's history does, so it is cached per chat and
+        reused across all steps of a task; the history mutators invalidate it."""
+        chat_history = self.get_history(chat_id_str)
+        cached = self._history_context_cache.get(chat_id_str)
+        if cached and cached[0] == len(chat_history):
+            return cached[1]
+
+        history_context = ""
+        if chat_history:
+            recent = reversed(list(itertools.islice(reversed(chat_history), 5))) # Only take the last 5 entries
+            history_context = (
+                "RECENT INTERACTIONS (last 5, use this context to inform your next actions):\n"
+                + "".join(
+                    f"- User: {entry[0]}\n"
+                    f"  Action Taken: {entry[1] if len(entry) > 1 else ''}\n"
+                    f"  Result: {(entry[2] or '')[:HISTORY_RESULT_PROMPT_CHARS] if len(entry) > 2 else ''}\n"
+                    for entry in recent
+                )
+                + "\n"
+            )
+        self._history_context_cache[chat_id_str] = (len(chat_history), history_context)
+        return history_context
+
     def load_learned_optimizations(self):
         """Loads learned optimizations from a local file."""
         try:
             if os.path.exists("learned_optimizations.txt"):
-                with open("learned_optimizations.txt", "r") as f:
-                    return f.read().strip()
+                return _read_cached("learned_optimizations.txt").strip()
         except:
             pass
         return ""
@@ -231,9 +397,8 @@ class Agent:
         chat_id_str = str(chat_id)
         hist = self.get_history(chat_id_str)
         # Entry format: [user_instr, actions_json, final_result, verification_status, verification_feedback]
-        hist.append([user_instruction, json.dumps(actions_data), final_result, None, None])
-        if len(hist) > 1000:
-            hist.pop(0)
+        hist.append([user_instruction, jsonutil.dumps(actions_data), final_result, None, None])
+        self._history_context_cache.pop(chat_id_str, None)
         self.save_sessions()
 
     def update_verification_to_history(self, chat_id: str, success: bool, feedback: str):
@@ -252,6 +417,7 @@ class Agent:
         hist = self.get_history(chat_id_str)
         if hist:
             hist[-1][2] = refined_result
+            self._history_context_cache.pop(chat_id_str, None)
             self.save_sessions()
 
     def reset_task_steps(self):
@@ -266,11 +432,20 @@ class Agent:
 
     def load_prompt(self):
         try:
-            with open("system_prompt.txt", "r") as f:
-                self.system_instruction = f.read()
+            self._set_system_instruction(_read_cached("system_prompt.txt"))
         except FileNotFoundError:
             print("Warning: system_prompt.txt not found. Please ensure it exists.")
-            self.system_instruction = ""
+            self._set_system_instruction("")
+
+    def _set_system_instruction(self, text: str):
+        """Updates the system prompt and pre-builds the analyze_and_act request config, so the
+        (large) system instruction is wrapped into a Content once per prompt change, not per step."""
+        self.system_instruction = text
+        self._action_config = types.GenerateContentConfig(
+            system_instruction=types.Content(parts=[types.Part.from_text(text=text)]) if text else None,
+            response_mime_type="application/json",
+            temperature=0.4, # Lower temperature for more deterministic actions
+        )
             
     async def decide_strategy(self, user_instruction: str, chat_id: int) -> tuple[str, str, str]:
         """
@@ -281,9 +456,9 @@ class Agent:
         chat_history = self.get_history(chat_id_str)
         history_context = ""
         if chat_history:
-            history_context = "PREVIOUS INTERACTIONS:\n"
-            for entry in chat_history:
-                history_context += f"- User: {entry[0]}\n  Result: {entry[2]}\n"
+            history_context = "PREVIOUS INTERACTIONS:\n" + "".join(
+                f"- User: {entry[0]}\n  Result: {(entry[2] or '')[:HISTORY_RESULT_PROMPT_CHARS]}\n" for entry in chat_history
+            )
 
         memory_context = self.memory.get_context_summary()
 
@@ -459,8 +634,13 @@ Return a JSON object:
                 new_prompt = data.get("new_system_prompt")
                 new_opts = data.get("new_learned_optimizations")
 
+                prompt_rejected = bool(new_prompt) and not _prompt_describes_actions(new_prompt)
+                if prompt_rejected:
+                    print("[IMPROVE] Rejected new system prompt: it no longer describes the JSON action format.")
+                    new_prompt = None
+
                 if new_prompt:
-                    self.system_instruction = new_prompt
+                    self._set_system_instruction(new_prompt)
                     with open("system_prompt.txt", "w") as f:
                         f.write(new_prompt)
                 
@@ -469,6 +649,16 @@ Return a JSON object:
                     with open("learned_optimizations.txt", "w") as f:
                         f.write(new_opts)
 
+                if not (new_prompt or new_opts):
+                    print("[IMPROVE] Nothing applied: no usable prompt or optimizations returned.")
+                    return None
+
+                # mtime granularity can be coarse; drop cached contents explicitly
+                _read_text.cache_clear()
+
+                if prompt_rejected:
+                    return ("Learned optimizations updated. The rewritten system prompt was rejected "
+                            "because it no longer describes the JSON action format.")
                 return "Prompts improved based on session history!"
             except Exception as inner:
                 print(f"Inner improvement error: {inner}")
@@ -478,9 +668,47 @@ Return a JSON object:
             print(f"Error in improve_prompt: {e}")
             return None
 
-    async def analyze_and_act(self, user_instruction: str, screenshot_bytes: bytes, chat_id: int, user_image_path: str = None) -> tuple[str, bool, str]:
+    async def _record_step(self, actions_data: list) -> str:
+        """Records this turn's actions, URL and page snippet in the step journal. Returns the URL."""
+        page_text_snippet = ""
+        current_url = ""
+        try:
+            page_text_snippet = await self.browser.get_text_content()
+            page_text_snippet = page_text_snippet[:300] if page_text_snippet else ""
+        except Exception:
+            pass
+        try:
+            current_url = await self.browser.get_url()
+        except Exception:
+            pass
+        
+        self._task_steps.append({
+            "turn": len(self._task_steps) + 1,
+            "actions": [
+                {"action": d.get("action"), "text": d.get("text", ""), 
+                 "coordinates": d.get("coordinates"), "reasoning": d.get("reasoning", "")}
+                for d in actions_data
+            ],
+            "page_text": page_text_snippet,
+            "url": current_url,
+        })
+        print(f"[STEP JOURNAL] Turn {len(self._task_steps)} recorded. URL={current_url!r}")
+        return current_url
+
+    async def _record_partial_step(self, executed_actions: list, problem: str):
+        """Journals actions that already ran while streaming when the full response turned out unusable,
+        so the next turn's prompt still reflects their side effects."""
+        if not executed_actions:
+            return
+        self._last_action_errors.append(
+            f"response: {problem}, but {len(executed_actions)} action(s) before that were already executed"
+        )
+        await self._record_step(executed_actions)
+
+    async def analyze_and_act(self, user_instruction: str, screenshot_bytes: bytes, chat_id: int, user_image_path: str = None, dom_snapshot: str = None) -> tuple[str, bool, str]:
         """
         Sends screenshot + instruction to Gemini Vision, gets a JSON action (or array of actions), and executes it.
+        dom_snapshot can be passed in when already captured (see BrowserManager.snapshot) to skip fetching it again.
         Returns a tuple: (status_string, is_done_boolean, audio_path_string) to help the bot know when to stop.
         """
         if not screenshot_bytes:
@@ -488,24 +716,16 @@ Return a JSON object:
 
         # 1. Compile History into Prompt
         chat_id_str = str(chat_id)
-        chat_history = self.get_history(chat_id_str)
-        history_context = ""
-        if chat_history:
-            history_context = "RECENT INTERACTIONS (last 5, use this context to inform your next actions):\n"
-            for entry in chat_history[-5:]: # Only take the last 5 entries
-                past_instruction = entry[0]
-                past_action = entry[1] if len(entry) > 1 else ""
-                past_result = entry[2] if len(entry) > 2 else ""
-                history_context += f"- User: {past_instruction}\n  Action Taken: {past_action}\n  Result: {past_result}\n"
-            history_context += "\n"
+        history_context = self._recent_history_context(chat_id_str)
 
         memory_context = self.memory.get_context_summary()
         plan_context = f"\nCURRENT GLOBAL PLAN:\n{json.dumps(self.current_plan, indent=2)}\n" if self.current_plan else ""
-        dom_snapshot = ""
-        try:
-            dom_snapshot = await self.browser.get_accessibility_snapshot()
-        except:
-            pass
+        if dom_snapshot is None:
+            dom_snapshot = ""
+            try:
+                dom_snapshot = await self.browser.get_accessibility_snapshot()
+            except:
+                pass
         dom_context = f"\nDOM SNAPSHOT (Interactive Elements):\n{dom_snapshot}\n" if dom_snapshot else ""
 
         # --- Inject action errors from the previous turn ---
@@ -604,157 +824,55 @@ Return a JSON object:
                 with open(user_image_path, "rb") as f:
                     parts.append(types.Part.from_bytes(data=f.read(), mime_type="image/jpeg"))
 
-            response = await self._call_gemini(
+            # Stream the response and start executing actions as soon as they are
+            # complete, so browser work overlaps with the rest of the model's output.
+            response_text = ""
+            streamed_actions = None
+            executed = 0
+            is_done = False
+            final_result = "Processing..."
+            async for chunk_text in self._stream_gemini(
                 contents=[
                     types.Content(
                         role="user",
                         parts=parts,
                     ),
                 ],
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_instruction,
-                    response_mime_type="application/json",
-                    temperature=0.4, # Lower temperature for more deterministic actions
-                ),
-            )
-            
-            response_text = response.text
+                config=self._action_config,
+            ):
+                response_text += chunk_text
+                if is_done:
+                    continue
+                streamed_actions, _ = _extract_actions(jsonutil.loads_partial(response_text))
+                # The last action may still be streaming in; only run the ones before it
+                if streamed_actions and len(streamed_actions) - 1 > executed:
+                    ready = streamed_actions[executed:-1]
+                    executed += len(ready)
+                    final_result, is_done = await self._run_actions(ready, final_result)
+
             print(f"Gemini Response: {response_text}") # Debug log
 
             try:
-                data = json.loads(response_text)
-                # Ensure we are working with a list of actions
-                if isinstance(data, dict):
-                    if "actions" in data and isinstance(data["actions"], list):
-                        actions_data = data["actions"]
-                        thought = data.get("thought", "")
-                        if thought:
-                            print(f"\n[THOUGHT]: {thought}\n")
-                    else:
-                        actions_data = [data] # fallback
-                elif isinstance(data, list):
-                    actions_data = data
-                else:
-                    return "Error: Gemini did not return a valid action array or object.", False, None
-            except json.JSONDecodeError:
+                data = jsonutil.loads(response_text)
+            except jsonutil.JSONDecodeError:
+                if executed:
+                    await self._record_partial_step(streamed_actions[:executed], "invalid JSON")
                 return f"Error: Gemini returned invalid JSON: {response_text}", False, None
 
-            is_done = False
-            final_result = "Processing..."
-            
-            # Execute multiple actions
-            for action_data in actions_data:
-                action = action_data.get("action")
-                text = action_data.get("text", "")
-                coordinates = action_data.get("coordinates")
-                key = action_data.get("key", "")
-                reasoning = action_data.get("reasoning", "")
-                
-                print(f"Executing Action: {action} ({reasoning})")
-                
-                action_result = None  # Track result for error feedback
-
-                if action == "navigate":
-                    action_result = await self.browser.navigate(text)
-                    await self.browser.smart_wait(5000)
-                elif action == "click":
-                    if coordinates and len(coordinates) == 2:
-                        action_result = await self.browser.click(int(coordinates[0]), int(coordinates[1]))
-                        # Longer wait after submit-like clicks to allow page transitions
-                        if any(kw in reasoning.lower() for kw in ["login", "iniciar", "submit", "sign in", "guardar", "save", "register", "registrar"]):
-                            await self.browser.smart_wait(5000)
-                    else:
-                        action_result = f"Warning: click action missing valid coordinates: {action_data}"
-                        print(action_result)
-                elif action == "type":
-                    # Use fill_field: triple-click to select all existing content, then type
-                    # This REPLACES whatever is in the field instead of appending.
-                    if coordinates and len(coordinates) == 2:
-                        action_result = await self.browser.fill_field(int(coordinates[0]), int(coordinates[1]), text)
-                    else:
-                        action_result = await self.browser.type_text(text)
-                # --- Semantic (coordinate-free) actions — PREFERRED for forms ---
-                elif action == "fill_by_placeholder":
-                    placeholder = action_data.get("placeholder", text)
-                    action_result = await self.browser.fill_by_placeholder(placeholder, text)
-                    print(f"  → {action_result}")
-                elif action == "fill_by_label":
-                    label = action_data.get("label", text)
-                    action_result = await self.browser.fill_by_label(label, text)
-                    print(f"  → {action_result}")
-                elif action == "click_button":
-                    action_result = await self.browser.click_by_text(text)
-                    print(f"  → {action_result}")
-                    if any(kw in text.lower() for kw in ["iniciar", "login", "sign in", "submit", "guardar", "registrar"]):
-                        await self.browser.smart_wait(5000)
-                # --- SoM Actions ---
-                elif action == "click_id":
-                    som_id = action_data.get("id", text)
-                    action_result = await self.browser.click_by_id(som_id)
-                    print(f"  → {action_result}")
-                elif action == "fill_id":
-                    som_id = action_data.get("id")
-                    action_result = await self.browser.fill_by_id(som_id, text)
-                    print(f"  → {action_result}")
-                elif action == "inspect_form":
-                    fields_json = await self.browser.get_form_fields()
-                    final_result = f"Form fields: {fields_json}"
-                    print(f"  → {final_result[:200]}")
-                elif action == "key":
-                    action_result = await self.browser.press_key(key or text)
-                elif action == "read":
-                    page_text = await self.browser.get_text_content()
-                    final_result = page_text[:2000] if page_text else "No text found."
-                elif action == "scroll":
-                    direction = action_data.get("direction", "down").lower()
-                    action_result = await self.browser.scroll(direction)
-                elif action == "wait":
-                    await self.browser.smart_wait(3000)
-                elif action == "generate_image":
-                    final_result = await self.generate_image(text)
-                    is_done = True
-                    break
-                elif action == "answer":
-                    final_result = text
-                    is_done = True
-                    break
-                elif action == "done":
-                    final_result = text or "Task completed."
-                    is_done = True
-                    break
-                
-                # --- Action Feedback Loop: track errors for next turn ---
-                if action_result and isinstance(action_result, str) and "error" in action_result.lower():
-                    self._last_action_errors.append(f"{action}: {action_result}")
-                    print(f"  ⚠️ [ERROR TRACKED] {action}: {action_result}")
+            # Ensure we are working with a list of actions
+            actions_data, thought = _extract_actions(data)
+            if actions_data is None:
+                if executed:
+                    await self._record_partial_step(streamed_actions[:executed], "not a valid action array or object")
+                return "Error: Gemini did not return a valid action array or object.", False, None
+            if thought:
+                print(f"\n[THOUGHT]: {thought}\n")
 
-                # Small delay between chained actions to let the page update
-                await asyncio.sleep(0.3)
+            if not is_done:
+                final_result, is_done = await self._run_actions(actions_data[executed:], final_result)
             
             # --- Record this turn in the step journal ---
-            page_text_snippet = ""
-            current_url = ""
-            try:
-                page_text_snippet = await self.browser.get_text_content()
-                page_text_snippet = page_text_snippet[:300] if page_text_snippet else ""
-            except Exception:
-                pass
-            try:
-                current_url = await self.browser.get_url()
-            except Exception:
-                pass
-            
-            self._task_steps.append({
-                "turn": len(self._task_steps) + 1,
-                "actions": [
-                    {"action": d.get("action"), "text": d.get("text", ""), 
-                     "coordinates": d.get("coordinates"), "reasoning": d.get("reasoning", "")}
-                    for d in actions_data
-                ],
-                "page_text": page_text_snippet,
-                "url": current_url,
-            })
-            print(f"[STEP JOURNAL] Turn {len(self._task_steps)} recorded. URL={current_url!r}")
+            current_url = await self._record_step(actions_data)
             
             # --- Hard bailout: if the same non-empty URL has appeared 4+ times total ---
             if not is_done and current_url:
@@ -796,6 +914,156 @@ Return a JSON object:
             print(f"Error in analyze_and_act: {e}")
             return f"Error: {e}", True, None
 
+    # --- Action handlers ---
+    # Each takes a parsed Action and returns (step_msg, is_done). For actions in
+    # _OUTPUT_ACTIONS step_msg is the turn's result; for the rest it is the browser
+    # status message, used for error feedback.
+
+    async def _do_navigate(self, a):
+        result = await self.browser.navigate(a.text)
+        await self.browser.smart_wait(5000)
+        return result, False
+
+    async def _do_click(self, a):
+        if not a.has_coordinates():
+            result = f"Warning: click action missing valid coordinates: {a}"
+            print(result)
+            return result, False
+        result = await self.browser.click(int(a.coordinates[0]), int(a.coordinates[1]))
+        # Longer wait after submit-like clicks to allow page transitions
+        if any(kw in a.reasoning.lower() for kw in _SUBMIT_KEYWORDS):
+            await self.browser.smart_wait(5000)
+        return result, False
+
+    async def _do_type(self, a):
+        # Use fill_field: triple-click to select all existing content, then type
+        # This REPLACES whatever is in the field instead of appending.
+        if a.has_coordinates():
+            return await self.browser.fill_field(int(a.coordinates[0]), int(a.coordinates[1]), a.text), False
+        return await self.browser.type_text(a.text), False
+
+    # --- Semantic (coordinate-free) actions — PREFERRED for forms ---
+    async def _do_fill_by_placeholder(self, a):
+        placeholder = a.placeholder if a.placeholder is not None else a.text
+        result = await self.browser.fill_by_placeholder(placeholder, a.text)
+        print(f"  → {result}")
+        return result, False
+
+    async def _do_fill_by_label(self, a):
+        label = a.label if a.label is not None else a.text
+        result = await self.browser.fill_by_label(label, a.text)
+        print(f"  → {result}")
+        return result, False
+
+    async def _do_click_button(self, a):
+        result = await self.browser.click_by_text(a.text)
+        print(f"  → {result}")
+        if any(kw in a.text.lower() for kw in ["iniciar", "login", "sign in", "submit", "guardar", "registrar"]):
+            await self.browser.smart_wait(5000)
+        return result, False
+
+    # --- SoM Actions ---
+    async def _do_click_id(self, a):
+        result = await self.browser.click_by_id(a.id if a.id is not None else a.text)
+        print(f"  → {result}")
+        return result, False
+
+    async def _do_fill_id(self, a):
+        result = await self.browser.fill_by_id(a.id, a.text)
+        print(f"  → {result}")
+        return result, False
+
+    async def _do_inspect_form(self, a):
+        fields_json = await self.browser.get_form_fields()
+        result = f"Form fields: {fields_json}"
+        print(f"  → {result[:200]}")
+        return result, False
+
+    async def _do_key(self, a):
+        return await self.browser.press_key(a.key or a.text), False
+
+    async def _do_read(self, a):
+        page_text = await self.browser.get_text_content()
+        return (page_text[:2000] if page_text else "No text found."), False
+
+    async def _do_scroll(self, a):
+        return await self.browser.scroll(a.direction.lower()), False
+
+    async def _do_wait(self, a):
+        await self.browser.smart_wait(3000)
+        return None, False
+
+    async def _do_generate_image(self, a):
+        return await self.generate_image(a.text), True
+
+    async def _do_answer(self, a):
+        return a.text, True
+
+    async def _do_done(self, a):
+        return a.text or "Task completed.", True
+
+    async def _execute_action(self, a) -> tuple[str, bool]:
+        """
+        Executes a single parsed Action via the handler table.
+        Returns a tuple: (final_result_or_None, is_done_boolean). final_result is only set by
+        actions that produce output for the user (read, inspect_form, answer, ...).
+        """
+        print(f"Executing Action: {a.action} ({a.reasoning})")
+
+        handler = self._actions.get(a.action)
+        if handler is None:
+            return None, False
+        step_msg, is_done = await handler(a)
+
+        if a.action in _OUTPUT_ACTIONS:
+            return step_msg, is_done
+
+        self._track_action_error(a.action, step_msg)
+        return None, is_done
+
+    def _track_action_error(self, action: str, step_msg: str):
+        """Action Feedback Loop: remembers failed actions so the next turn's prompt can report them."""
+        if step_msg and isinstance(step_msg, str) and "error" in step_msg.lower():
+            self._last_action_errors.append(f"{action}: {step_msg}")
+            print(f"  ⚠️ [ERROR TRACKED] {action}: {step_msg}")
+
+    async def _run_actions(self, actions_data: list, final_result: str) -> tuple[str, bool]:
+        """
+        Executes a sequence of actions in order, stopping at the first terminal one.
+        Returns a tuple: (final_result, is_done_boolean).
+        """
+        actions = [Action.from_dict(d) for d in actions_data]
+        i = 0
+        while i < len(actions):
+            # Fuse a run of scrolls into a single page.evaluate round-trip
+            batch = []
+            for a in actions[i:]:
+                op = _batch_op(a)
+                if op is None:
+                    break
+                batch.append((a, op))
+
+            if len(batch) > 1:
+                print(f"[BATCH] Executing {len(batch)} actions in one round-trip")
+                results = await self.browser.batch_actions([op for _, op in batch])
+                for (a, _), step_msg in zip(batch, results):
+                    print(f"Executing Action: {a.action} ({a.reasoning}) → {step_msg}")
+                    self._track_action_error(a.action, step_msg)
+                i += len(batch)
+                await asyncio.sleep(0.3)
+                continue
+
+            result, is_done = await self._execute_action(actions[i])
+            i += 1
+            if result is not None:
+                final_result = result
+            if is_done:
+                return final_result, True
+
+            # Small delay between chained actions to let the page update
+            await asyncio.sleep(0.3)
+        return final_result, False
+
     async def generate_image(self, prompt: str) -> str:
         """
         Uses available image models to generate an image from a prompt.
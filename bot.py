@@ -25,6 +25,10 @@ last_chat_id = None
 # Concurrency guard: one autonomous task per user at a time
 _user_locks: dict[int, asyncio.Lock] = {}
 
+async def on_shutdown(application):
+    """Closes the shared Chromium process when the bot stops."""
+    await BrowserManager.shutdown_all()
+
 def load_whitelist():
     try:
         with open("whitelist.txt", "r") as f:
@@ -202,21 +206,22 @@ async def _solve_autonomous_inner(chat_id: int, user_text: str, context: Context
                 await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
                 
                 # Draw SoM labels before taking the screenshot for Gemini
+                # Screenshot and DOM snapshot are captured concurrently
                 await browser.draw_som()
-                screenshot = await browser.take_screenshot()
+                screenshot, dom_snapshot = await browser.snapshot()
                 # Remove labels immediately so they don't interfere with the page state
                 await browser.remove_som()
 
                 if not screenshot:
                     await browser.navigate("https://lite.duckduckgo.com/lite/")
                     await browser.draw_som()
-                    screenshot = await browser.take_screenshot()
+                    screenshot, dom_snapshot = await browser.snapshot()
                     await browser.remove_som()
                     if not screenshot:
                         await context.bot.send_message(chat_id=chat_id, text="Failed to start browser.")
                         return
 
-                step_text, is_done, step_tts = await agent.analyze_and_act(user_text, screenshot, chat_id, user_image_path)
+                step_text, is_done, step_tts = await agent.analyze_and_act(user_text, screenshot, chat_id, user_image_path, dom_snapshot)
                 if not is_done:
                      short_response = step_text[:200] + "..." if len(step_text) > 200 else step_text
                      await context.bot.send_message(chat_id=chat_id, text=f"⏳ {short_response}")
@@ -428,7 +433,7 @@ if __name__ == '__main__':
         print(f"Error initializing Agent: {e}")
         exit(1)
 
-    application = ApplicationBuilder().token(bot_token).build()
+    application = ApplicationBuilder().token(bot_token).post_shutdown(on_shutdown).build()
     
     start_handler = CommandHandler('start', start)
     browse_handler = CommandHandler(['browse', 'browser'], browse_command)
@@ -1,40 +1,59 @@
 import asyncio
+import jsonutil
 from playwright.async_api import async_playwright, Page, BrowserContext
 
 class BrowserManager:
+    # A single Playwright driver and Chromium process are shared by every manager
+    # in the process; each manager only owns a (cheap) BrowserContext and page.
+    _playwright = None
+    _browser = None
+    _lock = asyncio.Lock()
+
     def __init__(self):
-        self.playwright = None
-        self.browser = None
         self.context: BrowserContext = None
         self.page: Page = None
 
     async def start(self):
-        """Starts the Playwright browser."""
-        if self.playwright:
+        """Opens a fresh browser context, launching the shared browser on first use
+        (or again after it crashed)."""
+        if self.page and not self.page.is_closed():
             return
+        if self.context:
+            await self.stop() # Leftover from a crashed/closed browser
 
-        self.playwright = await async_playwright().start()
-        # Launch headless by default, but you can set headless=False for debugging
-        self.browser = await self.playwright.chromium.launch(headless=True)
-        self.context = await self.browser.new_context(
+        async with BrowserManager._lock:
+            if BrowserManager._browser is None or not BrowserManager._browser.is_connected():
+                if BrowserManager._playwright is None:
+                    BrowserManager._playwright = await async_playwright().start()
+                # Launch headless by default, but you can set headless=False for debugging
+                BrowserManager._browser = await BrowserManager._playwright.chromium.launch(headless=True)
+        self.context = await BrowserManager._browser.new_context(
             viewport={"width": 1920, "height": 1080},
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
         )
         self.page = await self.context.new_page()
 
     async def stop(self):
-        """Stops the browser and cleans up resources."""
+        """Closes this manager's context (cookies, storage, pages). The shared browser keeps running."""
         if self.context:
-            await self.context.close()
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
+            try:
+                await self.context.close()
+            except Exception:
+                pass # Browser already gone (e.g. crashed); nothing left to close
         
         self.page = None
         self.context = None
-        self.browser = None
-        self.playwright = None
+
+    @classmethod
+    async def shutdown_all(cls):
+        """Closes the shared browser and Playwright driver. Call once at process exit."""
+        async with cls._lock:
+            if cls._browser:
+                await cls._browser.close()
+            if cls._playwright:
+                await cls._playwright.stop()
+            cls._browser = None
+            cls._playwright = None
 
     async def smart_wait(self, timeout_ms=5000):
         """Waits for the page to finish loading or navigating.
@@ -48,7 +67,7 @@ class BrowserManager:
 
     async def navigate(self, url: str):
         """Navigates to the specified URL."""
-        if not self.page:
+        if not self.page or self.page.is_closed():
             await self.start()
         try:
             await self.page.goto(url, wait_until="domcontentloaded", timeout=30000)
@@ -57,10 +76,24 @@ class BrowserManager:
             return f"Error navigating to {url}: {str(e)}"
 
     async def take_screenshot(self) -> bytes:
-        """Takes a screenshot of the current page and returns bytes."""
+        """Takes a screenshot of the current page and returns bytes.
+        Quality 60 keeps the upload to Gemini small while leaving UI text legible.
+        The image is not downscaled: click coordinates returned by the model are
+        in screenshot pixels and must map 1:1 onto the viewport."""
         if not self.page:
             return None
-        return await self.page.screenshot(type="jpeg", quality=80)
+        return await self.page.screenshot(type="jpeg", quality=60)
+
+    async def snapshot(self) -> tuple[bytes, str]:
+        """Takes a screenshot and the interactive-element DOM snapshot concurrently.
+        Returns (screenshot_bytes, dom_snapshot), or (None, "") if the browser is not active."""
+        if not self.page:
+            return None, ""
+        screenshot, dom_snapshot = await asyncio.gather(
+            self.take_screenshot(),
+            self.get_accessibility_snapshot(),
+        )
+        return screenshot, dom_snapshot
 
     async def get_title(self) -> str:
         if not self.page:
@@ -92,12 +125,27 @@ class BrowserManager:
         types the new text — replacing whatever was already in the field."""
         if not self.page:
             return "Browser not active"
-        # Triple-click selects the entire field value across all input types
+        # Triple-click selects a single-line input's value, but only the current
+        # paragraph in a <textarea> or contenteditable; Ctrl+A covers those.
         await self.page.mouse.click(x, y, click_count=3)
         await self.page.keyboard.press("Control+a")
         await self.page.keyboard.type(text)
         return f"Filled field at ({x}, {y}) with: {text}"
 
+    async def batch_actions(self, ops: list) -> list:
+        """Runs a run of scroll ops ({"op": "scroll", "dy": int}) inside the page with one
+        evaluate() call instead of one CDP round-trip each. Returns one status message per op."""
+        if not self.page:
+            return ["Browser not active"] * len(ops)
+        try:
+            return await self.page.evaluate("""(ops) => ops.map(op => {
+                if (op.op !== 'scroll') return `Error: unsupported batch op ${op.op}`;
+                window.scrollBy({top: op.dy, behavior: 'instant'});
+                return op.dy > 0 ? 'Scrolled down' : 'Scrolled up';
+            })""", ops)
+        except Exception as e:
+            return [f"Error running batched actions: {e}"] * len(ops)
+
     async def press_key(self, key: str):
         """Presses a specific key (e.g., 'Enter', 'ArrowDown')."""
         if not self.page:
@@ -119,11 +167,15 @@ class BrowserManager:
         if not self.page:
             return "Browser not active"
         
+        # window.scrollBy rather than mouse.wheel: the wheel fires at the pointer (whatever
+        # was clicked last, e.g. an inner scroll box or a map) and returns before the scroll
+        # settles. behavior 'instant' overrides CSS scroll-behavior: smooth, so the window
+        # scroll completes before evaluate returns, same as in batch_actions.
         if direction == "down":
-            await self.page.evaluate("window.scrollBy(0, 500)")
+            await self.page.evaluate("window.scrollBy({top: 500, behavior: 'instant'})")
             return "Scrolled down"
         elif direction == "up":
-            await self.page.evaluate("window.scrollBy(0, -500)")
+            await self.page.evaluate("window.scrollBy({top: -500, behavior: 'instant'})")
             return "Scrolled up"
         return "Invalid scroll direction"
 
@@ -175,26 +227,31 @@ class BrowserManager:
         if not self.page:
             return "Browser not active"
         try:
-            fields = await self.page.evaluate("""() => {
-                const inputs = Array.from(document.querySelectorAll('input, select, textarea'));
-                return inputs.map(el => ({
-                    tag: el.tagName.toLowerCase(),
-                    type: el.type || '',
-                    id: el.id || '',
-                    name: el.name || '',
-                    placeholder: el.placeholder || '',
-                    value: el.value || '',
-                    label: (() => {
-                        if (el.id) {
-                            const lbl = document.querySelector('label[for="' + el.id + '"]');
-                            return lbl ? lbl.innerText.trim() : '';
-                        }
-                        return '';
-                    })()
-                }));
+            # Columns (one array per attribute) instead of one object per field: fewer
+            # objects/key strings in V8 and a smaller CDP payload.
+            columns = await self.page.evaluate("""() => {
+                const inputs = document.querySelectorAll('input, select, textarea');
+                // Index labels once instead of querying the DOM for each input
+                const labels = new Map();
+                for (const l of document.querySelectorAll('label[for]')) {
+                    if (!labels.has(l.htmlFor)) labels.set(l.htmlFor, l.innerText.trim());
+                }
+                const cols = {tag: [], type: [], id: [], name: [], placeholder: [], value: [], label: []};
+                for (let i = 0; i < inputs.length; i++) {
+                    const el = inputs[i];
+                    cols.tag.push(el.tagName.toLowerCase());
+                    cols.type.push(el.type || '');
+                    cols.id.push(el.id || '');
+                    cols.name.push(el.name || '');
+                    cols.placeholder.push(el.placeholder || '');
+                    cols.value.push(el.value || '');
+                    cols.label.push((el.id && labels.get(el.id)) || '');
+                }
+                return cols;
             }""")
-            import json
-            return json.dumps(fields, ensure_ascii=False)
+            keys = list(columns)
+            fields = [dict(zip(keys, row)) for row in zip(*columns.values())]
+            return jsonutil.dumps(fields)
         except Exception as e:
             return f"Error getting form fields: {e}"
 
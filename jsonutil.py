@@ -0,0 +1,43 @@
+import json
+
+# orjson is optional: it parses the model's short action JSON several times
+# faster than the stdlib, but everything works without it.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# jiter is optional: it can parse a truncated JSON prefix, which lets callers
+# act on a streamed response before it is complete.
+try:
+    import jiter
+except ImportError:
+    jiter = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep
+# catching the stdlib exception either way.
+JSONDecodeError = json.JSONDecodeError
+
+def loads(data):
+    """Parses a JSON str/bytes payload."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj) -> str:
+    """Serializes obj to a compact UTF-8 JSON string (non-ASCII kept as-is)."""
+    if orjson:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def loads_partial(data):
+    """Parses a possibly truncated JSON document, returning the part that is
+    available so far. Returns None if jiter is not installed or nothing parses yet."""
+    if jiter is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        return jiter.from_json(data, partial_mode="trailing-strings")
+    except ValueError:
+        return None